@@ -1,29 +1,210 @@
-import time
-from typing import Any, Dict, Tuple, Optional
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, Union
+
+import orjson
+from cachetools import TLRUCache
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+class _Failure:
+    """Negativ-Eintrag: merkt sich einen Upstream-Fehler für kurze Zeit."""
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
 
 class TTLCache:
-    def __init__(self, ttl_seconds: int = 60, max_items: int = 1000):
+    def __init__(self, ttl_seconds: int = 60, max_items: int = 1000, negative_ttl_seconds: int = 0,
+                 negative_error_types: Tuple[Type[BaseException], ...] = (),
+                 ttl_for: Optional[Callable[[Any], Optional[int]]] = None):
         self.ttl = ttl_seconds
+        # optional: TTL je Wert (None = Standard-TTL), z. B. kürzer für unvollständige Ergebnisse
+        self.ttl_for = ttl_for
         self.max_items = max_items
-        self._store: Dict[str, Tuple[float, Any]] = {}
+        # >0: fehlgeschlagene Fetches so lange direkt mit demselben Fehler beantworten –
+        # aber nur Fehler aus `negative_error_types` (Upstream), nie Programmierfehler
+        self.negative_ttl = negative_ttl_seconds
+        self.negative_error_types = negative_error_types
+        # cachetools übernimmt Ablauf und LRU-Eviction; Einträge sind (ttl, value, expires),
+        # damit jeder Eintrag seine eigene TTL hat und die Rest-TTL ablesbar bleibt
+        self._store = TLRUCache(maxsize=max_items, ttu=lambda _key, item, _now: item[2])
+        # Laufende Upstream-Fetches je Key (Single-Flight)
+        self._inflight: Dict[str, asyncio.Future] = {}
 
-    def _evict_if_needed(self):
-        if len(self._store) <= self.max_items:
-            return
-        oldest_key = min(self._store, key=lambda k: self._store[k][0])
-        self._store.pop(oldest_key, None)
+    def _lookup(self, key: str) -> Optional[Any]:
+        item = self._store.get(key)
+        return item[1] if item is not None else None
 
     def get(self, key: str) -> Optional[Any]:
-        now = time.time()
+        value = self._lookup(key)
+        return None if isinstance(value, _Failure) else value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        if ttl is None and self.ttl_for is not None:
+            ttl = self.ttl_for(value)
+        if ttl is None:
+            ttl = self.ttl
+        self._store[key] = (ttl, value, self._store.timer() + ttl)
+
+    def remaining_ttl(self, key: str) -> Optional[float]:
+        """Sekunden bis zum Ablauf des Eintrags (None bei Miss oder Negativ-Eintrag)."""
         item = self._store.get(key)
-        if not item:
-            return None
-        ts, value = item
-        if now - ts > self.ttl:
-            self._store.pop(key, None)
+        if item is None or isinstance(item[1], _Failure):
             return None
+        return max(0.0, item[2] - self._store.timer())
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Liefert den Cache-Wert oder holt ihn über `fetch`. Gleichzeitige Misses
+        auf denselben Key warten auf genau einen Upstream-Call (Single-Flight).
+        Mit `negative_ttl` wird ein Fehler aus `negative_error_types` kurz gecached
+        und ohne Upstream-Call erneut geworfen; alle anderen Fehler laufen ungecached durch.
+        """
+        value = self._lookup(key)
+        if isinstance(value, _Failure):
+            # je Aufrufer eine eigene Instanz: parallele Handler überschreiben sich sonst
+            # gegenseitig __traceback__/__context__ am gemeinsamen Objekt
+            raise _copy_error(value.error) from None
+        if value is not None:
+            return value
+        task = self._inflight.get(key)
+        if task is None:
+            # Eigener Task: bricht der auslösende Request ab (Client weg), läuft
+            # der Fetch für alle anderen Wartenden trotzdem zu Ende
+            task = asyncio.create_task(self._fetch(key, fetch))
+            task.add_done_callback(_consume_result)
+            self._inflight[key] = task
+        # shield: ein abgebrochener Wartender darf den Fetch nicht mitreißen
+        try:
+            return await asyncio.shield(task)
+        except Exception as e:
+            # alle Wartenden teilen sich die Exception des Tasks – auch hier je eine Kopie,
+            # mit dem Traceback des Fetches
+            raise _copy_error(e).with_traceback(e.__traceback__) from None
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except self.negative_error_types as e:
+            if self.negative_ttl:
+                self.set(key, _Failure(_copy_error(e)), ttl=self.negative_ttl)
+            raise
+        else:
+            self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+
+def _copy_error(error: BaseException) -> BaseException:
+    """Neue Instanz mit Typ, args und Attributen von `error`, ohne Traceback und Kontext."""
+    fresh = type(error).__new__(type(error), *error.args)
+    fresh.__dict__.update(vars(error))
+    return fresh
+
+
+def _consume_result(task: asyncio.Task):
+    # Fehler als abgeholt markieren, falls alle Wartenden schon weg sind
+    if not task.cancelled():
+        task.exception()
+
+
+class RedisTTLCache:
+    """
+    Geteilter L2-Cache in Redis (über Worker und Restarts hinweg).
+    Werte werden als orjson gespeichert; Redis-Fehler und nicht lesbare Werte gelten
+    als Miss, damit ein ausgefallenes Redis nie den Request selbst scheitern lässt.
+    """
+    def __init__(self, redis: Redis, ttl_seconds: int, prefix: str = "fmp-proxy:"):
+        self.redis = redis
+        self.ttl = ttl_seconds
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        value, _ = await self.get_with_ttl(key)
         return value
 
-    def set(self, key: str, value: Any):
-        self._store[key] = (time.time(), value)
-        self._evict_if_needed()
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[Any], float]:
+        """
+        Wert plus Rest-TTL in Sekunden (in einem Roundtrip), damit L1 einen
+        fast abgelaufenen Redis-Eintrag nicht länger hält als Redis selbst.
+        """
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                raw, pttl = await pipe.get(self.prefix + key).pttl(self.prefix + key).execute()
+        except RedisError:
+            return None, 0
+        if raw is None:
+            return None, 0
+        try:
+            value = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # kaputter/fremder Wert unter unserem Prefix: Miss, Key verwerfen
+            await self._delete(key)
+            return None, 0
+        return value, (pttl / 1000 if pttl > 0 else self.ttl)
+
+    async def _delete(self, key: str):
+        try:
+            await self.redis.delete(self.prefix + key)
+        except RedisError:
+            pass
+
+    async def set(self, key: str, value: Any):
+        try:
+            await self.redis.set(self.prefix + key, orjson.dumps(value), ex=self.ttl)
+        except RedisError:
+            pass
+
+
+class TieredCache:
+    """
+    L1 (TTLCache im Prozess, kurze TTL) vor L2 (Redis, volle TTL).
+    Single-Flight läuft über L1, ein L1-Miss fragt erst Redis, dann Upstream.
+    """
+    def __init__(self, l1: TTLCache, l2: RedisTTLCache):
+        self.l1 = l1
+        self.l2 = l2
+        self.ttl = l2.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        # nur L1 – synchron wie TTLCache.get
+        return self.l1.get(key)
+
+    def remaining_ttl(self, key: str) -> Optional[float]:
+        # L1 ist nie länger gültig als der L2-Eintrag (siehe get_or_fetch)
+        return self.l1.remaining_ttl(key)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        remaining = None
+
+        async def from_l2():
+            nonlocal remaining
+            value, remaining = await self.l2.get_with_ttl(key)
+            if value is None:
+                remaining = None
+                value = await fetch()
+                await self.l2.set(key, value)
+            return value
+
+        value = await self.l1.get_or_fetch(key, from_l2)
+        # Aus Redis geholt: L1 höchstens so lange halten, wie der L2-Eintrag noch lebt
+        if remaining is not None and remaining < self.l1.ttl:
+            self.l1.set(key, value, ttl=remaining)
+        return value
+
+
+def build_cache(name: str, ttl_seconds: int, redis: Optional[Redis] = None,
+                l1_ttl_seconds: int = 60, negative_ttl_seconds: int = 0,
+                negative_error_types: Tuple[Type[BaseException], ...] = ()) -> Union[TTLCache, TieredCache]:
+    """
+    Ohne Redis: reiner In-Process-Cache. Mit Redis: L1 (max. `l1_ttl_seconds`) + L2,
+    Redis-Keys mit `name` als Namespace. Negativ-Einträge liegen immer nur in L1.
+    """
+    negative = dict(negative_ttl_seconds=negative_ttl_seconds, negative_error_types=negative_error_types)
+    if redis is None:
+        return TTLCache(ttl_seconds, **negative)
+    return TieredCache(
+        TTLCache(min(ttl_seconds, l1_ttl_seconds), **negative),
+        RedisTTLCache(redis, ttl_seconds, prefix=f"fmp-proxy:{name}:"),
+    )
@@ -1,20 +1,70 @@
 import httpx
+import orjson
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 from .config import settings
 
 BASE_URL = "https://financialmodelingprep.com/api/v3"
 
+# Erwartbare Fehler eines FMP-Calls: HTTP/Transport (inkl. Timeouts) und kaputtes JSON.
+# Aufrufer fangen nur diese ab – CancelledError und echte Bugs (auch ein beliebiger
+# ValueError aus eigenem Code) laufen durch.
+FMP_ERRORS = (httpx.HTTPError, orjson.JSONDecodeError)
 
+# Alle get_*-Helper erwarten `symbol` bereits normalisiert (upper-case);
+# das erledigen die Handler in main.py einmal pro Request.
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Gemeinsamer AsyncClient (Connection-Pool + Keep-Alive) für alle FMP-Calls.
+    HTTP/2: parallele Calls (gather in /analyze) laufen als Streams über eine Verbindung.
+    Wird beim Startup angelegt; fällt sonst beim ersten Zugriff lazy an.
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            # kurzer Connect-Timeout: ein hängender Verbindungsaufbau geht schnell in den Retry
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """
+    Nur transiente Fehler wiederholen: Verbindungsprobleme/Timeouts und 5xx.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=0.1, max=2.0),
+    retry=retry_if_exception(_is_retryable),
+    reraise=True,
+)
 async def _get(path: str, params: dict):
     """
     Interner GET-Helper mit API-Key.
     """
     params = dict(params or {})
     params["apikey"] = settings.fmp_api_key
-    url = f"{BASE_URL}/{path.lstrip('/')}"
-    async with httpx.AsyncClient(timeout=25.0) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
+    r = await get_client().get(path.lstrip("/"), params=params)
+    r.raise_for_status()
+    return orjson.loads(r.content)
 
 
 # -----------------------
@@ -22,10 +72,10 @@ async def _get(path: str, params: dict):
 # -----------------------
 
 async def get_price_quote(symbol: str):
-    return await _get(f"quote/{symbol.upper()}", params={})
+    return await _get(f"quote/{symbol}", params={})
 
 async def get_company_profile(symbol: str):
-    return await _get(f"profile/{symbol.upper()}", params={})
+    return await _get(f"profile/{symbol}", params={})
 
 
 # -----------------------
@@ -34,9 +84,9 @@ async def get_company_profile(symbol: str):
 
 async def get_income_statement(symbol: str, period: str = "ttm", limit: int = 1):
     if period == "ttm":
-        return await _get(f"income-statement-ttm/{symbol.upper()}", params={})
+        return await _get(f"income-statement-ttm/{symbol}", params={})
     return await _get(
-        f"income-statement/{symbol.upper()}",
+        f"income-statement/{symbol}",
         params={"period": period, "limit": limit},
     )
 
@@ -44,15 +94,15 @@ async def get_balance_sheet(symbol: str, period: str = "annual", limit: int = 1)
     if period not in ("annual", "quarter"):
         period = "annual"
     return await _get(
-        f"balance-sheet-statement/{symbol.upper()}",
+        f"balance-sheet-statement/{symbol}",
         params={"period": period, "limit": limit},
     )
 
 async def get_cash_flow(symbol: str, period: str = "ttm", limit: int = 1):
     if period == "ttm":
-        return await _get(f"cash-flow-statement-ttm/{symbol.upper()}", params={})
+        return await _get(f"cash-flow-statement-ttm/{symbol}", params={})
     return await _get(
-        f"cash-flow-statement/{symbol.upper()}",
+        f"cash-flow-statement/{symbol}",
         params={"period": period, "limit": limit},
     )
 
@@ -63,17 +113,17 @@ async def get_cash_flow(symbol: str, period: str = "ttm", limit: int = 1):
 
 async def get_key_metrics(symbol: str, period: str = "ttm", limit: int = 1):
     if period == "ttm":
-        return await _get(f"key-metrics-ttm/{symbol.upper()}", params={})
+        return await _get(f"key-metrics-ttm/{symbol}", params={})
     return await _get(
-        f"key-metrics/{symbol.upper()}",
+        f"key-metrics/{symbol}",
         params={"period": period, "limit": limit},
     )
 
 async def get_financial_ratios(symbol: str, period: str = "ttm", limit: int = 1):
     if period == "ttm":
-        return await _get(f"ratios-ttm/{symbol.upper()}", params={})
+        return await _get(f"ratios-ttm/{symbol}", params={})
     return await _get(
-        f"ratios/{symbol.upper()}",
+        f"ratios/{symbol}",
         params={"period": period, "limit": limit},
     )
 
@@ -83,10 +133,10 @@ async def get_financial_ratios(symbol: str, period: str = "ttm", limit: int = 1)
 # -----------------------
 
 async def get_peers(symbol: str):
-    return await _get("stock_peers", params={"symbol": symbol.upper()})
+    return await _get("stock_peers", params={"symbol": symbol})
 
 async def get_company_news(symbol: str, from_date: str = None, to_date: str = None, limit: int = 50):
-    params = {"tickers": symbol.upper(), "limit": limit}
+    params = {"tickers": symbol, "limit": limit}
     if from_date:
         params["from"] = from_date
     if to_date:
@@ -111,7 +161,7 @@ async def search_symbol(query: str, exchange: str | None = None, limit: int = 10
 
 async def get_analyst_estimates(symbol: str, period: str = "annual", limit: int = 8):
     return await _get(
-        f"analyst-estimates/{symbol.upper()}",
+        f"analyst-estimates/{symbol}",
         params={"period": period, "limit": limit},
     )
 
@@ -122,15 +172,15 @@ async def get_analyst_estimates(symbol: str, period: str = "annual", limit: int
 
 async def get_dividends_history(symbol: str, limit: int = 200):
     return await _get(
-        f"historical-price-full/stock_dividend/{symbol.upper()}",
+        f"historical-price-full/stock_dividend/{symbol}",
         params={"limit": limit},
     )
 
 async def get_dividend_calendar(symbol: str):
     try:
-        return await _get("stock_dividend_calendar", params={"symbol": symbol.upper()})
-    except Exception:
-        return await _get("dividend_calendar", params={"symbol": symbol.upper()})
+        return await _get("stock_dividend_calendar", params={"symbol": symbol})
+    except FMP_ERRORS:
+        return await _get("dividend_calendar", params={"symbol": symbol})
 
 
 # -----------------------
@@ -139,7 +189,7 @@ async def get_dividend_calendar(symbol: str):
 
 async def get_financial_growth(symbol: str, period: str = "annual", limit: int = 5):
     return await _get(
-        f"financial-growth/{symbol.upper()}",
+        f"financial-growth/{symbol}",
         params={"period": period, "limit": limit},
     )
 
@@ -149,4 +199,4 @@ async def get_financial_growth(symbol: str, period: str = "annual", limit: int =
 # -----------------------
 
 async def get_insider_trades(symbol: str, limit: int = 20):
-    return await _get("insider-trading", params={"symbol": symbol.upper(), "limit": limit})
+    return await _get("insider-trading", params={"symbol": symbol, "limit": limit})
@@ -1,152 +1,379 @@
+import asyncio
+import hashlib
+import math
+import re
+import orjson
 from fastapi import FastAPI, HTTPException, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from datetime import datetime, timezone
-from typing import Optional, Callable, Any
+from redis.asyncio import Redis
+from typing import Optional, Callable, Any, Tuple
 
 from .config import settings
-from .cache import TTLCache
+from .cache import TTLCache, build_cache
 from . import fmp
-from .schemas import PriceRequest, FundamentalsRequest, NewsRequest, AnalyzeRequest
+from .schemas import Symbol, PriceRequest, FundamentalsRequest, NewsRequest, AnalyzeRequest
+from .middleware import BearerAuthMiddleware, GZipMiddleware
+from . import openai_client
 from .openai_client import get_client
-from .prompts import ANALYZE_TEMPLATE
+from .prompts import ANALYZE_SYSTEM, render_analyze
 
-app = FastAPI(title="FMP + ChatGPT Proxy", version="0.7.0")
+app = FastAPI(title="FMP + ChatGPT Proxy", version="0.7.0",
+              default_response_class=ORJSONResponse)
+
+# --- Auth (innerste Middleware: CORS-Preflights und -Header laufen außen herum) ---
+if settings.action_key:
+    app.add_middleware(
+        BearerAuthMiddleware,
+        token=settings.action_key,
+        public_paths=("/health", "/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc"),
+    )
 
 # --- CORS ---
-origins = [o.strip() for o in (settings.cors_origins if isinstance(settings.cors_origins, list)
-                               else str(settings.cors_origins).split(','))]
+# einmal beim Import: getrimmt, ohne Leereinträge. frozenset, weil Starlette pro
+# Request `origin in allow_origins` prüft – Hash-Lookup statt Listen-Scan.
+# "*" (Default) nimmt Starlettes Wildcard-Pfad; ein leerer Wert sperrt Cross-Origin.
+origins = frozenset(o for o in (o.strip() for o in settings.cors_origins.split(",")) if o)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins or ["*"],
+    allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# --- Caches ---
-price_cache = TTLCache(60)
-news_cache  = TTLCache(300)
-fund_cache  = TTLCache(1800)
+# --- Kompression (große JSON-Bündel; SSE bleibt unkomprimiert) ---
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# --- Caches (mit REDIS_URL: lokal als L1 vor geteiltem Redis-L2) ---
+redis_client = Redis.from_url(settings.redis_url) if settings.redis_url else None
+# Fehler von FMP werden NEGATIVE_TTL Sekunden gemerkt: bei Ausfällen schnell
+# scheitern statt FMP bei jedem Retry erneut zu belasten.
+# Nur Upstream-Fehler (FMP_ERRORS) – ein Bug im eigenen Code wird nie gecached.
+NEGATIVE_TTL = 15
+NEGATIVE = dict(negative_ttl_seconds=NEGATIVE_TTL, negative_error_types=fmp.FMP_ERRORS)
+price_cache = build_cache("price", 60, redis_client, **NEGATIVE)
+news_cache  = build_cache("news", 300, redis_client, **NEGATIVE)
+fund_cache  = build_cache("fund", 1800, redis_client, **NEGATIVE)
+# Profil & Peers ändern sich kaum – eigener Tages-Cache statt Fetch pro /analyze
+profile_cache = build_cache("profile", 24 * 3600, redis_client, **NEGATIVE)
+peers_cache   = build_cache("peers", 24 * 3600, redis_client, **NEGATIVE)
+# Freitext → Ticker (z. B. "apple" → AAPL): Namen wiederholen sich ständig
+resolve_cache = TTLCache(24 * 3600, max_items=4096)
+RESOLVE_MISS_TTL = 600
+# Fertige LLM-Analysen (nur lokal, nie in Redis): gleiche Anfrage binnen 10 Min → kein LLM-Call
+# Fehlten dabei Quote/Profil/Abschlüsse wegen eines FMP-Fehlers, nur kurz merken. Extras
+# und Peers zählen nicht: ein dauerhaft gesperrter Endpunkt (4xx je nach FMP-Plan) würde
+# sonst jede Analyse auf die kurze TTL drücken.
+DEGRADED_ANALYZE_TTL = 60
+analyze_cache = TTLCache(600, ttl_for=lambda a: DEGRADED_ANALYZE_TTL if a["degraded"] else None)
+
+# --- Lifecycle (je ein HTTP-Pool für FMP und OpenAI, Redis-Pool schließen) ---
+@app.on_event("startup")
+async def _startup():
+    fmp.get_client()
+    get_client()
 
-def _auth_check(authorization: Optional[str]):
-    if settings.action_key and authorization != f"Bearer {settings.action_key}":
-        raise HTTPException(status_code=401, detail="Unauthorized")
+@app.on_event("shutdown")
+async def _shutdown():
+    await fmp.close_client()
+    await openai_client.close_client()
+    if redis_client is not None:
+        await redis_client.aclose()
 
 # --- Helpers ---
+def conditional_json(content: dict, etag_source: Any, max_age: int,
+                     if_none_match: Optional[str]) -> Response:
+    """
+    JSON-Antwort (nur für GET) mit schwachem ETag (Hash über `etag_source`) und Cache-Control.
+    Schwach, weil `etag_source` nur den inhaltlichen Teil abdeckt – Felder wie `cached`
+    ändern die Bytes, nicht die Aussage. Passt If-None-Match, geht nur ein leeres 304 zurück.
+    """
+    digest = hashlib.sha1(orjson.dumps(etag_source, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    etag = f'W/"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+    if if_none_match:
+        # Weak Comparison (RFC 9110): W/-Präfix auf beiden Seiten ignorieren
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if etag.removeprefix("W/") in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return ORJSONResponse(content, headers=headers)
+
 async def try_fetch(fn: Callable[[], Any], fallback=None):
     try:
         return await fn()
-    except Exception:
+    except fmp.FMP_ERRORS:
         return fallback
 
-async def try_ttm_then_annual(ttm_fn: Callable[[], Any], annual_fn: Callable[[], Any]):
-    try:
-        data = await ttm_fn()
-        if not data:
-            data = await annual_fn()
-        return data
-    except Exception:
-        return await annual_fn()
-
-async def optional_call(module: Any, func_name: str, *args, **kwargs):
-    func = getattr(module, func_name, None)
+def latest_row(rows: Any) -> list:
+    """Jüngste Zeile einer FMP-Historie (neueste zuerst) als 1-elementige Liste."""
+    return rows[:1] if isinstance(rows, list) else []
+
+def cached_fetch(cache: Any, key: str, fn: Callable[[], Any], fallback=None):
+    """try_fetch über `cache.get_or_fetch`: Treffer ohne FMP-Call, parallele Misses teilen sich einen."""
+    return try_fetch(lambda: cache.get_or_fetch(key, fn), fallback)
+
+def fund_fetch(func: Callable[..., Any], name: str, symbol: str, period: str, limit: int):
+    """Fundamentaldaten über fund_cache, Key z. B. "income:AAPL:ttm:1". None = FMP-Fehler."""
+    return cached_fetch(fund_cache, f"{name}:{symbol}:{period}:{limit}",
+                        lambda: func(symbol, period, limit))
+
+# Optionale FMP-Helper einmal beim Import aufgelöst (fehlt einer, liefert optional_call [],
+# ein FMP-Fehler wie bei try_fetch None)
+_FMP_FUNCS = {
+    name: getattr(fmp, name, None)
+    for name in ("get_analyst_estimates", "get_dividends_history", "get_dividend_calendar", "get_insider_trades")
+}
+
+async def optional_call(func_name: str, *args, **kwargs):
+    func = _FMP_FUNCS.get(func_name)
     if func is None:
         return []
     try:
         return await func(*args, **kwargs)
-    except Exception:
-        return []
+    except fmp.FMP_ERRORS:
+        return None
+
+# Ticker: 1–6 Zeichen, optional Börsensuffix (z. B. SAP.DE, 7203.T)
+_TICKER_RE = re.compile(r"[A-Z0-9]{1,6}(?:\.[A-Z0-9]{1,8})?")
 
 def looks_like_ticker(s: str) -> bool:
-    s2 = s.strip().upper()
-    if len(s2) <= 6 and s2.isalnum():
-        return True
-    if "." in s2 and 1 <= len(s2.split(".", 1)[0]) <= 6:
-        return True
-    return False
+    return _TICKER_RE.fullmatch(s.strip().upper()) is not None
 
 async def resolve_symbol(user_input: str) -> str:
-    if not user_input:
-        return user_input
-    s = user_input.strip()
+    """
+    Ticker oder Freitext → Ticker. Findet die Suche nichts, gibt es direkt ein 422
+    statt eines Fan-outs und LLM-Calls auf ein Symbol, das es nicht gibt.
+    """
+    s = (user_input or "").strip()
+    if not s:
+        raise HTTPException(status_code=422, detail="Missing symbol")
     if looks_like_ticker(s):
         return s.upper()
-    results = await optional_call(fmp, "search_symbol", s, None, 10)
+    key = s.lower()
+    cached = resolve_cache.get(key)
+    if cached is not None:
+        if not cached:
+            raise HTTPException(status_code=422, detail=f"Unknown symbol: {s}")
+        return cached
+    # None = Suche fehlgeschlagen (nicht cachen), [] = echter Nicht-Treffer
+    results = await try_fetch(lambda: fmp.search_symbol(s, None, 10), None)
     if isinstance(results, list) and results:
         sym = results[0].get("symbol") or results[0].get("ticker") or s
-        return (sym or s).upper()
-    return s.upper()
+        resolved = (sym or s).upper()
+        resolve_cache.set(key, resolved)
+        return resolved
+    if results is None:
+        return s.upper()
+    # Tippfehler o. Ä. kürzer merken ("" = kein Treffer), damit FMP nicht bei jedem Versuch gefragt wird
+    resolve_cache.set(key, "", ttl=RESOLVE_MISS_TTL)
+    raise HTTPException(status_code=422, detail=f"Unknown symbol: {s}")
+
+# --- Prompt-Daten: nur bewertungsrelevante Felder, kompakt als JSON ---
+# FMP liefert je Zeile dutzende Felder; ins Prompt kommt nur, was die Analyse nutzt.
+# Feldnamen ohne "TTM"-Suffix – die TTM-Varianten (z. B. peRatioTTM) matchen mit.
+PROFILE_FIELDS = frozenset({
+    "symbol", "companyName", "exchangeShortName", "sector", "industry", "country",
+    "currency", "mktCap", "price", "beta", "lastDiv", "ipoDate",
+})
+QUOTE_FIELDS = frozenset({
+    "symbol", "price", "changesPercentage", "marketCap", "pe", "eps", "yearHigh", "yearLow",
+    "priceAvg50", "priceAvg200", "sharesOutstanding", "earningsAnnouncement", "timestamp",
+})
+INCOME_FIELDS = frozenset({
+    "date", "period", "revenue", "grossProfit", "operatingIncome", "ebitda", "interestExpense",
+    "netIncome", "eps", "epsdiluted", "weightedAverageShsOutDil",
+})
+BALANCE_FIELDS = frozenset({
+    "date", "period", "cashAndCashEquivalents", "totalCurrentAssets", "totalCurrentLiabilities",
+    "totalAssets", "totalLiabilities", "totalDebt", "netDebt", "totalStockholdersEquity",
+})
+CASHFLOW_FIELDS = frozenset({
+    "date", "period", "operatingCashFlow", "capitalExpenditure", "freeCashFlow",
+    "dividendsPaid", "commonStockRepurchased", "stockBasedCompensation",
+})
+KEY_METRICS_FIELDS = frozenset({
+    "date", "period", "marketCap", "enterpriseValue", "peRatio", "pfcfRatio", "evToSales",
+    "enterpriseValueOverEBITDA", "freeCashFlowYield", "earningsYield", "dividendYield",
+    "payoutRatio", "debtToEquity", "netDebtToEBITDA", "interestCoverage", "roic", "roe",
+})
+RATIOS_FIELDS = frozenset({
+    "date", "period", "grossProfitMargin", "operatingProfitMargin", "netProfitMargin",
+    "returnOnEquity", "returnOnAssets", "currentRatio", "debtEquityRatio", "interestCoverage",
+    "priceEarningsRatio", "peRatio", "priceToFreeCashFlowsRatio", "priceEarningsToGrowthRatio",
+    "enterpriseValueMultiple", "dividendYield", "payoutRatio",
+})
+
+def _select_fields(rows: Any, keys: frozenset) -> list:
+    """
+    Projiziert FMP-Zeilen (Liste oder einzelnes dict) auf `keys`.
+    """
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not isinstance(rows, list):
+        return []
+    # None-Felder bringen dem Modell nichts außer Tokens
+    return [
+        {k: v for k, v in r.items() if v is not None and (k in keys or k.removesuffix("TTM") in keys)}
+        for r in rows if isinstance(r, dict)
+    ]
+
+def _to_json(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
 
 def _safe(x, *keys, default=None):
-    cur = x
-    for k in keys:
-        if isinstance(cur, dict) and k in cur:
-            cur = cur[k]
-        else:
-            return default
-    return cur
+    # Kein isinstance pro Ebene: fehlende Keys, leere Listen und Nicht-Container
+    # landen alle im except. Funktioniert damit auch für Listen-Indizes.
+    try:
+        for k in keys:
+            x = x[k]
+        return x
+    except (KeyError, IndexError, TypeError):
+        return default
+
+# Historien (5J annual): noch schmaler als die TTM-Blöcke – nur die Zeitreihen,
+# auf die sich die Analyse (KGV-Historie, Margen, FCF-Trend, Verschuldung) stützt.
+INCOME_HIST_FIELDS = frozenset({"date", "revenue", "ebitda", "operatingIncome", "netIncome", "eps"})
+BALANCE_HIST_FIELDS = frozenset({"date", "cashAndCashEquivalents", "totalDebt", "netDebt", "totalStockholdersEquity"})
+CASHFLOW_HIST_FIELDS = frozenset({
+    "date", "operatingCashFlow", "capitalExpenditure", "freeCashFlow", "dividendsPaid", "commonStockRepurchased",
+})
+KEY_METRICS_HIST_FIELDS = frozenset({"date", "peRatio", "pfcfRatio", "enterpriseValueOverEBITDA", "roic", "dividendYield"})
+RATIOS_HIST_FIELDS = frozenset({
+    "date", "grossProfitMargin", "operatingProfitMargin", "netProfitMargin", "returnOnEquity", "priceEarningsRatio",
+})
+GROWTH_HIST_FIELDS = frozenset({"date", "revenueGrowth", "epsgrowth", "ebitgrowth", "freeCashFlowGrowth"})
+
+# Extras: Schätzungen, Dividenden, Insider – ebenfalls nur die ausgewerteten Felder
+ESTIMATES_FIELDS = frozenset({
+    "date", "estimatedRevenueAvg", "estimatedEbitdaAvg", "estimatedNetIncomeAvg",
+    "estimatedEpsAvg", "estimatedEpsLow", "estimatedEpsHigh", "numberAnalystsEstimatedEps",
+})
+DIVIDEND_FIELDS = frozenset({"date", "dividend", "adjDividend", "recordDate", "paymentDate", "declarationDate"})
+INSIDER_FIELDS = frozenset({
+    "transactionDate", "reportingName", "typeOfOwner", "transactionType",
+    "acquistionOrDisposition", "securitiesTransacted", "price",
+})
+DIVIDENDS_HISTORY_LIMIT = 20
+INSIDER_TRADES_LIMIT = 20
+
+def _dividend_rows(payload: Any, symbol: str) -> list:
+    """
+    Dividenden-Zeilen für `symbol`: Die Historie kommt als {"historical": [...]}
+    (FMP ignoriert dort `limit`), der Kalender kann Einträge anderer Symbole enthalten.
+    """
+    rows = payload.get("historical") if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        return []
+    return [r for r in rows if isinstance(r, dict) and r.get("symbol", symbol) == symbol]
+
+def _field(rows: Any, name: str) -> Any:
+    """Feld der jüngsten Zeile, mit oder ohne TTM-Suffix."""
+    row = _safe(rows, 0) if isinstance(rows, list) else rows
+    if not isinstance(row, dict):
+        return None
+    return row.get(name, row.get(name + "TTM"))
+
+def _ratio(a: Any, b: Any) -> Optional[float]:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and b:
+        return round(a / b, 2)
+    return None
 
 def compact_kpis(income_ttm, balance_1, cashflow_ttm, keym_ttm, ratios_ttm,
                  income_hist, balance_hist, cashflow_hist, keym_hist, ratios_hist,
                  growth_hist, marketcap_quote):
-    # Kurzfassung siehe vorherige Nachricht: baut TTM + 5Y Historie kompakt zusammen
-    # (Revenue, EBITDA, NetIncome, EPS … etc.)
-    # Rückgabe: dict {"ttm": {...}, "hist": {...}}
-    ...
-    # (Hier kommt der Extractor-Code aus der letzten Antwort rein)
-    ...
+    """
+    Baut TTM-Kennzahlen + 5J-Historie kompakt zusammen (Revenue, EBITDA, NetIncome, EPS …).
+    Rückgabe: dict {"ttm": {...}, "hist": {...}}
+    """
+    # keym_ttm/ratios_ttm gehen schon vollständig (projiziert) ins Prompt; hier nur
+    # die daraus nicht direkt ablesbaren, abgeleiteten Multiples.
+    market_cap = marketcap_quote or _field(keym_ttm, "marketCap")
+    net_income = _field(income_ttm, "netIncome")
+    fcf = _field(cashflow_ttm, "freeCashFlow")
+    net_debt = _field(balance_1, "netDebt")
+    ev = market_cap + net_debt if isinstance(market_cap, (int, float)) and isinstance(net_debt, (int, float)) else None
+    ttm = {
+        "marketCap": market_cap,
+        "pe": _ratio(market_cap, net_income),
+        "pFcf": _ratio(market_cap, fcf),
+        "enterpriseValue": ev,
+        "evEbitda": _ratio(ev, _field(income_ttm, "ebitda")),
+        "fcfConversion": _ratio(fcf, net_income),
+        "netDebtToEbitda": _ratio(net_debt, _field(income_ttm, "ebitda")),
+    }
+    hist = {
+        "income": _select_fields(income_hist, INCOME_HIST_FIELDS),
+        "balance": _select_fields(balance_hist, BALANCE_HIST_FIELDS),
+        "cashflow": _select_fields(cashflow_hist, CASHFLOW_HIST_FIELDS),
+        "keyMetrics": _select_fields(keym_hist, KEY_METRICS_HIST_FIELDS),
+        "ratios": _select_fields(ratios_hist, RATIOS_HIST_FIELDS),
+        "growth": _select_fields(growth_hist, GROWTH_HIST_FIELDS),
+    }
+    return {"ttm": ttm, "hist": hist}
 
-# --- Endpoints ---
+# Positionen im gather von build_analyze_prompt: quote, profile, income_ttm, income_hist, balance_hist
+_CORE_RESULTS = (0, 1, 2, 6, 7)
+# Quote, Profil, TTM-Abschlüsse und Historien (ohne Extras und Peers)
+_STATEMENT_RESULTS = range(12)
 
-@app.get("/health")
-async def health():
-    return {"ok": True, "model": settings.openai_model}
+async def build_analyze_prompt(symbol: str) -> Tuple[str, str, bool]:
+    """
+    Holt alle FMP-Daten für `symbol` und baut die User-Nachricht.
+    Rückgabe: (as_of_utc, prompt, degraded) – degraded: mind. ein Quote-/Profil-/Abschluss-Fetch
+    fiel wegen eines FMP-Fehlers auf [] zurück
+    """
+    # Datenstand = Start des Fan-outs; steht so vor den Fetches fest, nichts mehr danach
+    as_of = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M")
+    # Daten holen – alle Calls sind unabhängig, daher parallel statt nacheinander.
+    # Die Wrapper fangen Fehler selbst ab (Ergebnis None), ein Ausfall bricht das gather nicht ab.
+    results = await asyncio.gather(
+        # Quote teilt sich den Key mit /price
+        cached_fetch(price_cache, symbol, lambda: fmp.get_price_quote(symbol)),
+        cached_fetch(profile_cache, symbol, lambda: fmp.get_company_profile(symbol)),
+        fund_fetch(fmp.get_income_statement, "income", symbol, "ttm", 1),
+        fund_fetch(fmp.get_cash_flow, "cashflow", symbol, "ttm", 1),
+        fund_fetch(fmp.get_key_metrics, "key-metrics", symbol, "ttm", 1),
+        fund_fetch(fmp.get_financial_ratios, "ratios", symbol, "ttm", 1),
 
-@app.post("/price")
-async def price(req: PriceRequest, authorization: str = Header(None)):
-    _auth_check(authorization)
-    data = await fmp.get_price_quote(req.symbol)
-    return {"symbol": req.symbol.upper(), "data": data, "cached": False}
+        # Historien
+        fund_fetch(fmp.get_income_statement, "income", symbol, "annual", 5),
+        fund_fetch(fmp.get_balance_sheet, "balance", symbol, "annual", 5),
+        fund_fetch(fmp.get_cash_flow, "cashflow", symbol, "annual", 5),
+        fund_fetch(fmp.get_key_metrics, "key-metrics", symbol, "annual", 5),
+        fund_fetch(fmp.get_financial_ratios, "ratios", symbol, "annual", 5),
+        fund_fetch(fmp.get_financial_growth, "growth", symbol, "annual", 5),
 
-@app.post("/analyze")
-async def analyze(req: AnalyzeRequest, authorization: str = Header(None)):
-    _auth_check(authorization)
-    symbol = await resolve_symbol((req.symbol or "").strip())
-
-    # Daten holen
-    quote   = await try_fetch(lambda: fmp.get_price_quote(symbol), [])
-    profile = await try_fetch(lambda: fmp.get_company_profile(symbol), [])
-    income_ttm = await try_ttm_then_annual(
-        lambda: fmp.get_income_statement(symbol, "ttm", 1),
-        lambda: fmp.get_income_statement(symbol, "annual", 1)
-    )
-    cashflow_ttm = await try_ttm_then_annual(
-        lambda: fmp.get_cash_flow(symbol, "ttm", 1),
-        lambda: fmp.get_cash_flow(symbol, "annual", 1)
-    )
-    balance_annual_1 = await try_fetch(lambda: fmp.get_balance_sheet(symbol, "annual", 1), [])
-    key_metrics_ttm  = await try_ttm_then_annual(
-        lambda: fmp.get_key_metrics(symbol, "ttm", 1),
-        lambda: fmp.get_key_metrics(symbol, "annual", 1)
-    )
-    ratios_ttm       = await try_ttm_then_annual(
-        lambda: fmp.get_financial_ratios(symbol, "ttm", 1),
-        lambda: fmp.get_financial_ratios(symbol, "annual", 1)
+        # Extra
+        optional_call("get_analyst_estimates", symbol, "annual", 8),
+        optional_call("get_dividends_history", symbol, DIVIDENDS_HISTORY_LIMIT),
+        optional_call("get_dividend_calendar", symbol),
+        optional_call("get_insider_trades", symbol, INSIDER_TRADES_LIMIT),
+        cached_fetch(peers_cache, symbol, lambda: fmp.get_peers(symbol)),
     )
+    # None (FMP-Fehler) von [] (echt leer) unterscheiden, danach einheitlich mit [] weiter
+    failed = [r is None for r in results]
+    (
+        quote, profile, income_ttm, cashflow_ttm, key_metrics_ttm, ratios_ttm,
+        income_hist, balance_hist, cashflow_hist, keym_hist, ratios_hist, growth_hist,
+        estimates, dividends_history, dividend_calendar, insider_trades, peers,
+    ) = ([] if r is None else r for r in results)
 
-    # Historien
-    income_hist   = await try_fetch(lambda: fmp.get_income_statement(symbol, "annual", 5), [])
-    balance_hist  = await try_fetch(lambda: fmp.get_balance_sheet(symbol, "annual", 5), [])
-    cashflow_hist = await try_fetch(lambda: fmp.get_cash_flow(symbol, "annual", 5), [])
-    keym_hist     = await try_fetch(lambda: fmp.get_key_metrics(symbol, "annual", 5), [])
-    ratios_hist   = await try_fetch(lambda: fmp.get_financial_ratios(symbol, "annual", 5), [])
-    growth_hist   = await try_fetch(lambda: fmp.get_financial_growth(symbol, "annual", 5), [])
+    # TTM und Historie laufen parallel. Fehlt TTM, ist das jüngste Jahr der
+    # Historie der Annual-Fallback – kein zweiter, nachgelagerter Call mehr.
+    income_ttm       = income_ttm or latest_row(income_hist)
+    cashflow_ttm     = cashflow_ttm or latest_row(cashflow_hist)
+    key_metrics_ttm  = key_metrics_ttm or latest_row(keym_hist)
+    ratios_ttm       = ratios_ttm or latest_row(ratios_hist)
+    balance_annual_1 = latest_row(balance_hist)
 
-    # Extra
-    estimates = await optional_call(fmp, "get_analyst_estimates", symbol, "annual", 8)
-    dividends_history = await optional_call(fmp, "get_dividends_history", symbol, 20)
-    dividend_calendar = await optional_call(fmp, "get_dividend_calendar", symbol)
-    insider_trades    = await optional_call(fmp, "get_insider_trades", symbol, 20)
+    # Gar keine Kerndaten: kein Prompt, kein LLM-Call. Ist dabei ein Kern-Fetch
+    # (Quote, Profil, Income, Balance) fehlgeschlagen, liegt es an FMP, nicht am Symbol.
+    if not any((quote, profile, income_ttm, balance_annual_1)):
+        if any(failed[i] for i in _CORE_RESULTS):
+            raise HTTPException(status_code=502, detail="FMP error: core data unavailable")
+        raise HTTPException(status_code=422, detail=f"No data for symbol: {symbol}")
 
     marketcap_quote = None
     if isinstance(quote, list) and quote:
@@ -160,48 +387,144 @@ async def analyze(req: AnalyzeRequest, authorization: str = Header(None)):
     )
 
     # Prompt
-    as_of = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M")
-    prompt_base = ANALYZE_TEMPLATE.format(
-        perspective="value", language="de", symbol=symbol.upper(),
-        profile=profile, quote=quote, key_metrics=key_metrics_ttm, ratios=ratios_ttm,
-        income=income_ttm, balance=balance_annual_1, cashflow=cashflow_ttm,
-        peers=[], news=[], as_of=as_of
+    # Alle Blöcke einmal mit orjson serialisiert und in einem Durchlauf ins Template gefügt
+    prompt = render_analyze(
+        symbol=symbol, as_of=as_of,
+        profile=_to_json(_select_fields(profile, PROFILE_FIELDS)),
+        quote=_to_json(_select_fields(quote, QUOTE_FIELDS)),
+        key_metrics=_to_json(_select_fields(key_metrics_ttm, KEY_METRICS_FIELDS)),
+        ratios=_to_json(_select_fields(ratios_ttm, RATIOS_FIELDS)),
+        income=_to_json(_select_fields(income_ttm, INCOME_FIELDS)),
+        balance=_to_json(_select_fields(balance_annual_1, BALANCE_FIELDS)),
+        cashflow=_to_json(_select_fields(cashflow_ttm, CASHFLOW_FIELDS)),
+        peers=_to_json(peers), news=_to_json([]),
+        kpis=_to_json(kpis),
+        estimates=_to_json(_select_fields(estimates, ESTIMATES_FIELDS)),
+        dividends_history=_to_json(_select_fields(
+            _dividend_rows(dividends_history, symbol)[:DIVIDENDS_HISTORY_LIMIT], DIVIDEND_FIELDS)),
+        dividend_calendar=_to_json(_select_fields(_dividend_rows(dividend_calendar, symbol), DIVIDEND_FIELDS)),
+        insider_trades=_to_json(_select_fields(
+            insider_trades[:INSIDER_TRADES_LIMIT] if isinstance(insider_trades, list) else [], INSIDER_FIELDS)),
+    )
+    return as_of, prompt, any(failed[i] for i in _STATEMENT_RESULTS)
+
+# Einmal beim Import gebaut: identischer System-Prefix für jeden Request
+# (Voraussetzung für OpenAIs automatisches Prompt-Caching).
+ANALYZE_SYSTEM_MESSAGE = {"role": "system", "content": ANALYZE_SYSTEM}
+
+def analyze_llm_kwargs(prompt: str) -> dict:
+    return dict(
+        model=settings.openai_model,
+        messages=[
+            ANALYZE_SYSTEM_MESSAGE,
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.2,
+        max_tokens=1500,
     )
-    extras = f"""
 
-KPI-PAKET (kompakt; Quelle: FMP):
-{kpis}
+def sse_event(data: Any, event: Optional[str] = None) -> bytes:
+    head = f"event: {event}\n".encode() if event else b""
+    return head + b"data: " + orjson.dumps(data) + b"\n\n"
 
-ANALYSTEN-SCHÄTZUNGEN:
-{estimates}
+async def stream_analysis(symbol: str) -> StreamingResponse:
+    as_of, prompt, _ = await build_analyze_prompt(symbol)
 
-DIVIDENDEN:
-- Historie: {dividends_history}
-- Anstehend: {dividend_calendar}
+    async def events():
+        try:
+            client = get_client()
+            stream = await client.chat.completions.create(**analyze_llm_kwargs(prompt), stream=True)
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield sse_event({"delta": delta})
+        except Exception as e:
+            yield sse_event({"detail": f"LLM error: {str(e)}"}, event="error")
+            return
+        # Abschluss: Metadaten wie bei /analyze, Client kann den Stream schließen
+        yield sse_event({"done": True, "symbol": symbol, "model": settings.openai_model,
+                         "as_of_utc": as_of}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+# --- Endpoints ---
 
-INSIDER-TRADES (letzte 20):
-{insider_trades}
-"""
-    prompt = prompt_base + extras
+@app.get("/health")
+async def health():
+    return {"ok": True, "model": settings.openai_model}
 
+async def price_data(symbol: str) -> Tuple[Any, bool]:
+    """Quote über price_cache; Rückgabe (data, cached)."""
+    data = price_cache.get(symbol)
+    if data is not None:
+        return data, True
     try:
-        client = get_client()
-        result = client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": "Du bist ein Value-Investor. Schreibe eine Deep-Dive-Analyse (Deutsch). KGV zuerst. Keine Anlageberatung."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,
-            max_tokens=1500,
-        )
-        content = result.choices[0].message.content
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"LLM error: {str(e)}")
-
-    return {
-        "symbol": symbol.upper(),
-        "as_of_utc": as_of,
-        "model": settings.openai_model,
-        "analysis_md": content,
-    }
+        return await price_cache.get_or_fetch(symbol, lambda: fmp.get_price_quote(symbol)), False
+    except fmp.FMP_ERRORS as e:
+        raise HTTPException(status_code=502, detail=f"FMP error: {str(e)}")
+
+@app.post("/price")
+async def price(req: PriceRequest):
+    symbol = req.symbol.upper()
+    data, cached = await price_data(symbol)
+    return {"symbol": symbol, "data": data, "cached": cached}
+
+@app.get("/price/{symbol}")
+async def price_get(symbol: Symbol, if_none_match: Optional[str] = Header(None)):
+    """
+    Wie POST /price, aber cachebar: ETag + Cache-Control, 304 bei passendem If-None-Match.
+    """
+    symbol = symbol.upper()
+    data, cached = await price_data(symbol)
+    # max-age = Rest-Frische des Eintrags: ein Treffer ist evtl. schon fast abgelaufen.
+    # Frisch geholt ist das (aufgerundet) die volle TTL, aus Redis dessen Rest-TTL.
+    remaining = price_cache.remaining_ttl(symbol)
+    if remaining is None:
+        max_age = price_cache.ttl
+    else:
+        max_age = math.floor(remaining) if cached else math.ceil(remaining)
+    return conditional_json(
+        {"symbol": symbol, "data": data, "cached": cached},
+        etag_source={"symbol": symbol, "data": data}, max_age=max_age,
+        if_none_match=if_none_match,
+    )
+
+def analyze_response(symbol: str, analysis: dict, cached: bool) -> dict:
+    return {"symbol": symbol, "model": settings.openai_model, "as_of_utc": analysis["as_of_utc"],
+            "analysis_md": analysis["analysis_md"], "cached": cached}
+
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest,
+                  stream: bool = Query(False, description="true: Antwort als Server-Sent Events wie /analyze/stream")):
+    symbol = await resolve_symbol(req.symbol)
+    if stream:
+        return await stream_analysis(symbol)
+    key = f"{symbol}:{settings.openai_model}"
+    hit = analyze_cache.get(key)
+    if hit is not None:
+        return analyze_response(symbol, hit, cached=True)
+
+    async def run_analysis():
+        as_of, prompt, degraded = await build_analyze_prompt(symbol)
+        try:
+            client = get_client()
+            result = await client.chat.completions.create(**analyze_llm_kwargs(prompt))
+            content = result.choices[0].message.content
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"LLM error: {str(e)}")
+        return {"as_of_utc": as_of, "analysis_md": content, "degraded": degraded}
+
+    # Single-Flight: parallele Anfragen zum selben Symbol teilen sich Fan-out & LLM-Call
+    analysis = await analyze_cache.get_or_fetch(key, run_analysis)
+    return analyze_response(symbol, analysis, cached=False)
+
+@app.post("/analyze/stream")
+async def analyze_stream(req: AnalyzeRequest):
+    """
+    Wie /analyze, aber liefert die Analyse tokenweise als Server-Sent Events
+    (`data: {"delta": "..."}`), zum Schluss ein `done`-Event mit Symbol,
+    Modell und as_of_utc. /analyze bleibt für die GPT Action erhalten.
+    """
+    symbol = await resolve_symbol(req.symbol)
+    return await stream_analysis(symbol)
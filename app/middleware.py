@@ -0,0 +1,66 @@
+import hmac
+from typing import Iterable
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware as _GZipMiddleware, GZipResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class _SSEAwareGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith("text/event-stream"):
+                # unkomprimiert durchreichen: GzipFile puffert sonst die Events
+                self.content_encoding_set = True
+
+
+class GZipMiddleware(_GZipMiddleware):
+    """
+    Starlettes GZipMiddleware, aber ohne Kompression für Server-Sent Events
+    (/analyze/stream) – neuere Starlette-Versionen machen das von Haus aus.
+    """
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _SSEAwareGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class BearerAuthMiddleware:
+    """
+    Reine ASGI-Middleware für `Authorization: Bearer <ACTION_KEY>`.
+    Vergleicht die rohen Header-Bytes konstant-zeitig, ohne Request-Objekt;
+    `public_paths` (Health, OpenAPI/Docs für die GPT Action) bleiben offen.
+    """
+    def __init__(self, app: ASGIApp, token: str, public_paths: Iterable[str] = ()):
+        self.app = app
+        self.expected = b"Bearer " + token.encode()
+        self.public_paths = frozenset(public_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (scope["type"] != "http" or scope["method"] == "OPTIONS"
+                or scope["path"] in self.public_paths):
+            await self.app(scope, receive, send)
+            return
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                if hmac.compare_digest(value, self.expected):
+                    await self.app(scope, receive, send)
+                    return
+                break
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(_UNAUTHORIZED_BODY)).encode()),
+                (b"www-authenticate", b"Bearer"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": _UNAUTHORIZED_BODY})
+
+
+_UNAUTHORIZED_BODY = b'{"detail":"Unauthorized"}'
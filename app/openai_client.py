@@ -1,10 +1,28 @@
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from .config import settings
 
 _client = None
 
-def get_client() -> OpenAI:
+def get_client() -> AsyncOpenAI:
+    """
+    Ein AsyncOpenAI für den ganzen Prozess, mit eigenem HTTP/2-Pool: parallele
+    Analysen teilen sich die TLS-Verbindung zu api.openai.com statt je neu aufzubauen.
+    DefaultAsyncHttpxClient behält die Timeouts/Redirect-Defaults des SDK.
+    """
     global _client
     if _client is None:
-        _client = OpenAI(api_key=settings.openai_api_key)
+        _client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=DefaultAsyncHttpxClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            ),
+        )
     return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -1,6 +1,13 @@
-ANALYZE_TEMPLATE = """
+import string
+from typing import Callable
+
+# Statischer System-Prompt ohne Platzhalter: OpenAI cached nur exakt gleiche
+# Prefixe, daher stehen alle dynamischen Teile (Symbol, Datum, FMP-Daten)
+# ausschließlich in der User-Nachricht (ANALYZE_TEMPLATE).
+ANALYZE_SYSTEM = """
 Du bist ein **Value-Investor** und erstellst eine **ausführliche Deep-Dive-Analyse** (Deutsch).
 Ziel: Substanz & Bewertung im Mittelpunkt. Keine Anlageberatung; nur Bildung. Wenn Daten fehlen, sag es explizit.
+Die Eingabedaten (FMP, bereits geholt) samt Symbol und Datenstand kommen in der User-Nachricht.
 Antworte als strukturiertes **Markdown**, mit klaren Zwischenüberschriften, Tabellen (wo sinnvoll) und kurzen Formeln.
 
 **Gesetzte Prioritäten (sofort beachten):**
@@ -22,21 +29,8 @@ Antworte als strukturiertes **Markdown**, mit klaren Zwischenüberschriften, Tab
 
 ---
 
-**Eingabedaten (FMP, bereits geholt):**
-- Profil: {profile}
-- Quote: {quote}
-- Key Metrics: {key_metrics}
-- Ratios: {ratios}
-- Income Statement: {income}
-- Balance Sheet: {balance}
-- Cash Flow: {cashflow}
-- Peers: {peers}
-- News (Kurzliste): {news}
-
----
-
 **Erwartete Ausgabe-Struktur (Markdown):**
-# Deep-Dive {symbol}
+# Deep-Dive <Symbol>
 
 ## 1) Bewertung – **KGV zuerst**
 - Aktuelles KGV (mit Datum) vs. 5J/10J-Median (+ Perzentil)
@@ -69,5 +63,55 @@ Antworte als strukturiertes **Markdown**, mit klaren Zwischenüberschriften, Tab
 
 ---
 
-*Disclaimer: Dies ist **keine** Anlageberatung; nur zu Bildungszwecken. Quelle: FMP; Datenstand {as_of} UTC.*
+*Disclaimer: Dies ist **keine** Anlageberatung; nur zu Bildungszwecken. Quelle: FMP; Datenstand laut „As-of“ der Eingabedaten (UTC).*
 """
+
+ANALYZE_TEMPLATE = """
+Symbol: {symbol}
+As-of (UTC): {as_of}
+
+**Eingabedaten (FMP, bereits geholt):**
+- Profil: {profile}
+- Quote: {quote}
+- Key Metrics: {key_metrics}
+- Ratios: {ratios}
+- Income Statement: {income}
+- Balance Sheet: {balance}
+- Cash Flow: {cashflow}
+- Peers: {peers}
+- News (Kurzliste): {news}
+
+KPI-PAKET (kompakt; Quelle: FMP):
+{kpis}
+
+ANALYSTEN-SCHÄTZUNGEN:
+{estimates}
+
+DIVIDENDEN:
+- Historie: {dividends_history}
+- Anstehend: {dividend_calendar}
+
+INSIDER-TRADES (letzte 20):
+{insider_trades}
+"""
+
+
+def _compile(template: str) -> Callable[..., str]:
+    """
+    Zerlegt ein str.format-Template einmal beim Import in (Literal, Feldname)-Paare,
+    damit pro Request nur noch zusammengefügt statt neu geparst wird.
+    """
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        if spec or conversion:
+            raise ValueError(f"Format-Spec/Konvertierung nicht unterstützt: {{{field}}}")
+        parts.append((literal, field))
+
+    def render(**values) -> str:
+        return "".join(
+            literal if field is None else literal + str(values[field])
+            for literal, field in parts
+        )
+    return render
+
+render_analyze = _compile(ANALYZE_TEMPLATE)
@@ -1,20 +1,24 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Optional, List, Dict, Any
+
+# Ticker oder Firmenname (/analyze löst Freitext auf): in pydantic-core getrimmt
+# und begrenzt, damit leere oder überlange Eingaben nie bis zu FMP kommen.
+Symbol = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=64)]
 
 class PriceRequest(BaseModel):
-    symbol: str
+    symbol: Symbol
 
 class FundamentalsRequest(BaseModel):
-    symbol: str
+    symbol: Symbol
     period: str = Field("ttm", description="ttm | annual | quarter")
     limit: int = 1
 
 class NewsRequest(BaseModel):
-    symbol: str
+    symbol: Symbol
     from_date: Optional[str] = None
     to_date: Optional[str] = None
     limit: int = 30
 
 class AnalyzeRequest(BaseModel):
-    symbol: str
-    # Perioden pro Reporttyp (Balance hat kein T
+    symbol: Symbol
+    # Perioden pro Reporttyp (Balance hat kein TTM) legt /analyze selbst fest
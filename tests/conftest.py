@@ -0,0 +1,22 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Settings() liest beim Import ENV: Dummy-Keys, ohne ACTION_KEY (Auth separat getestet)
+os.environ.setdefault("FMP_API_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.pop("ACTION_KEY", None)
+os.environ.pop("REDIS_URL", None)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import main  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in (main.price_cache, main.news_cache, main.fund_cache, main.profile_cache,
+                  main.peers_cache, main.resolve_cache, main.analyze_cache):
+        cache._store.clear()
+    yield
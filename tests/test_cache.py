@@ -0,0 +1,209 @@
+import asyncio
+import time
+
+import fakeredis
+import httpx
+import pytest
+from redis.asyncio import Redis
+
+from app.cache import RedisTTLCache, TieredCache, TTLCache, build_cache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Upstream:
+    """Zählt Fetches; liefert `value` oder wirft `error` nach kurzer Verzögerung."""
+
+    def __init__(self, value="v", error=None, delay=0.05):
+        self.value = value
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+# --- Single-Flight ---
+
+def test_concurrent_misses_share_one_fetch():
+    cache = TTLCache(60)
+    fetch = Upstream()
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+
+    assert run(scenario()) == ["v"] * 5
+    assert fetch.calls == 1
+    assert cache.get("k") == "v"
+
+
+def test_leader_cancellation_does_not_cancel_waiters():
+    cache = TTLCache(60)
+    fetch = Upstream(delay=0.1)
+
+    async def scenario():
+        leader = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await waiter
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return result
+
+    assert run(scenario()) == "v"
+    assert fetch.calls == 1
+    assert cache.get("k") == "v"
+
+
+def test_error_reaches_every_waiter():
+    cache = TTLCache(60)
+    fetch = Upstream(error=httpx.ConnectError("down"))
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = run(scenario())
+    assert all(isinstance(r, httpx.ConnectError) for r in results)
+    assert fetch.calls == 1
+
+
+# --- Negativ-Cache ---
+
+def test_upstream_error_is_negative_cached_until_ttl():
+    cache = TTLCache(60, negative_ttl_seconds=0.2, negative_error_types=(httpx.HTTPError,))
+    fetch = Upstream(error=httpx.ConnectError("down"), delay=0)
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(httpx.ConnectError):
+                await cache.get_or_fetch("k", fetch)
+        assert fetch.calls == 1
+        assert cache.get("k") is None  # Negativ-Eintrag ist für get() ein Miss
+        await asyncio.sleep(0.25)
+        fetch.error = None
+        assert await cache.get_or_fetch("k", fetch) == "v"
+
+    run(scenario())
+    assert fetch.calls == 2
+
+
+def test_other_errors_are_not_negative_cached():
+    cache = TTLCache(60, negative_ttl_seconds=15, negative_error_types=(httpx.HTTPError,))
+    fetch = Upstream(error=KeyError("bug"), delay=0)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(KeyError):
+                await cache.get_or_fetch("k", fetch)
+
+    run(scenario())
+    assert fetch.calls == 2
+
+
+def test_negative_hits_raise_fresh_instances():
+    cache = TTLCache(60, negative_ttl_seconds=15, negative_error_types=(httpx.HTTPError,))
+    fetch = Upstream(error=httpx.ConnectError("down"), delay=0)
+
+    async def scenario():
+        raised = []
+        for _ in range(3):
+            try:
+                await cache.get_or_fetch("k", fetch)
+            except httpx.ConnectError as e:
+                raised.append(e)
+        return raised
+
+    first, *hits = run(scenario())
+    assert fetch.calls == 1
+    assert len({id(e) for e in (first, *hits)}) == 3
+    for e in hits:
+        assert str(e) == "down" and e.__suppress_context__ and e.__cause__ is None
+    # der gecachte Fehler selbst bleibt unberührt
+    assert cache._store["k"][1].error.__traceback__ is None
+
+
+def test_coalesced_waiters_get_their_own_exception():
+    cache = TTLCache(60)
+    fetch = Upstream(error=httpx.ConnectError("down"))
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = run(scenario())
+    assert len({id(e) for e in results}) == 3
+    assert all(e.__traceback__ is not None for e in results)
+
+
+def test_ttl_for_overrides_default_ttl():
+    cache = TTLCache(600, ttl_for=lambda v: 5 if v["degraded"] else None)
+    cache.set("partial", {"degraded": True})
+    cache.set("full", {"degraded": False})
+    assert cache._store["partial"][0] == 5
+    assert cache._store["full"][0] == 600
+
+
+# --- Redis L2 ---
+
+def test_l1_ttl_is_capped_by_remaining_redis_ttl():
+    redis = fakeredis.FakeAsyncRedis()
+    cache = build_cache("t", 3600, redis, l1_ttl_seconds=60)
+    assert isinstance(cache, TieredCache)
+    fetch = Upstream()
+
+    async def scenario():
+        await redis.set("fmp-proxy:t:k", b'"from-redis"', ex=5)
+        return await cache.get_or_fetch("k", fetch)
+
+    assert run(scenario()) == "from-redis"
+    assert fetch.calls == 0
+    ttl, value, _ = cache.l1._store["k"]
+    assert value == "from-redis" and ttl <= 5
+    assert cache.remaining_ttl("k") <= 5
+
+
+def test_miss_writes_through_to_redis():
+    redis = fakeredis.FakeAsyncRedis()
+    cache = build_cache("t", 3600, redis)
+    fetch = Upstream(value=[1, 2])
+
+    async def scenario():
+        assert await cache.get_or_fetch("k", fetch) == [1, 2]
+        return await redis.get("fmp-proxy:t:k"), await redis.ttl("fmp-proxy:t:k")
+
+    raw, ttl = run(scenario())
+    assert raw == b"[1,2]" and 0 < ttl <= 3600
+
+
+def test_corrupt_redis_value_is_a_miss_and_dropped():
+    redis = fakeredis.FakeAsyncRedis()
+    l2 = RedisTTLCache(redis, 60, prefix="p:")
+
+    async def scenario():
+        await redis.set("p:k", b"\xffnot json", ex=60)
+        return await l2.get_with_ttl("k"), await redis.exists("p:k")
+
+    assert run(scenario()) == ((None, 0), 0)
+
+
+def test_redis_down_falls_back_to_upstream_quickly():
+    # Port 1: Verbindungsaufbau schlägt sofort fehl bzw. läuft in den kurzen Timeout
+    redis = Redis.from_url("redis://127.0.0.1:1/0", socket_connect_timeout=0.2, socket_timeout=0.2)
+    cache = build_cache("t", 3600, redis)
+    fetch = Upstream(delay=0)
+
+    started = time.monotonic()
+    assert run(cache.get_or_fetch("k", fetch)) == "v"
+    assert time.monotonic() - started < 2
+    assert fetch.calls == 1
+    assert cache.get("k") == "v"
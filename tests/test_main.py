@@ -0,0 +1,233 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import orjson
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import fmp, main
+
+ROW = [{"symbol": "AAPL", "date": "2025-09-30", "revenue": 100, "netIncome": 10, "marketCap": 500}]
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def fake(result=None, error=None, calls=None):
+    async def fetch(*args, **kwargs):
+        if calls is not None:
+            calls.append(args)
+        if error is not None:
+            raise error
+        return result
+    return fetch
+
+
+@pytest.fixture
+def fmp_data(monkeypatch):
+    """Alle FMP-Helper liefern ROW; einzelne Tests überschreiben gezielt."""
+    for name in dir(fmp):
+        if name.startswith("get_") and name != "get_client":
+            monkeypatch.setattr(fmp, name, fake(ROW))
+    for name in main._FMP_FUNCS:
+        monkeypatch.setitem(main._FMP_FUNCS, name, fake(ROW))
+
+
+class FakeOpenAI:
+    def __init__(self, deltas=("Hallo", " Welt")):
+        self.deltas = deltas
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, stream=False, **kwargs):
+        self.calls += 1
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(self.deltas)))])
+
+        async def chunks():
+            for d in self.deltas:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=d))])
+        return chunks()
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    llm = FakeOpenAI()
+    monkeypatch.setattr(main, "get_client", lambda: llm)
+    return llm
+
+
+# --- /price ---
+
+def test_get_price_sends_weak_etag_and_answers_304(client, monkeypatch):
+    monkeypatch.setattr(fmp, "get_price_quote", fake(ROW))
+    r = client.get("/price/aapl")
+    assert r.status_code == 200 and r.json()["symbol"] == "AAPL"
+    etag = r.headers["etag"]
+    assert etag.startswith('W/"')
+    # frisch geholt: volle TTL
+    assert r.headers["cache-control"] == f"private, max-age={main.price_cache.ttl}"
+
+    # Cache-Treffer (cached=True) trägt denselben schwachen Validator
+    r = client.get("/price/AAPL", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b""
+    r = client.get("/price/AAPL", headers={"If-None-Match": etag.removeprefix("W/")})
+    assert r.status_code == 304
+
+
+def test_cached_price_sends_remaining_max_age(client, monkeypatch):
+    monkeypatch.setattr(fmp, "get_price_quote", fake(ROW))
+    assert client.get("/price/AAPL").json()["cached"] is False
+    time.sleep(1.1)
+    r = client.get("/price/AAPL")
+    assert r.json()["cached"] is True
+    max_age = int(r.headers["cache-control"].removeprefix("private, max-age="))
+    assert max_age <= main.price_cache.ttl - 1
+
+
+def test_etag_differs_per_symbol_for_empty_results(client, monkeypatch):
+    monkeypatch.setattr(fmp, "get_price_quote", fake([]))
+    assert client.get("/price/ZZZ").headers["etag"] != client.get("/price/YYY").headers["etag"]
+
+
+def test_post_price_never_answers_304(client, monkeypatch):
+    monkeypatch.setattr(fmp, "get_price_quote", fake(ROW))
+    etag = client.get("/price/AAPL").headers["etag"]
+    r = client.post("/price", json={"symbol": "aapl"}, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert "etag" not in r.headers
+    assert r.json() == {"symbol": "AAPL", "data": ROW, "cached": True}
+
+
+def test_price_maps_fmp_errors_to_502(client, monkeypatch):
+    monkeypatch.setattr(fmp, "get_price_quote", fake(error=httpx.ConnectError("down")))
+    r = client.post("/price", json={"symbol": "AAPL"})
+    assert r.status_code == 502
+
+
+def test_price_rejects_blank_symbol(client):
+    assert client.post("/price", json={"symbol": "   "}).status_code == 422
+
+
+# --- Symbol-Auflösung ---
+
+def test_ticker_input_skips_search(monkeypatch):
+    calls = []
+    monkeypatch.setattr(fmp, "search_symbol", fake([], calls=calls))
+    assert asyncio.run(main.resolve_symbol(" sap.de ")) == "SAP.DE"
+    assert calls == []
+
+
+def test_free_text_is_resolved_once_and_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(fmp, "search_symbol", fake([{"symbol": "aapl"}], calls=calls))
+    assert asyncio.run(main.resolve_symbol("Apple Inc")) == "AAPL"
+    assert asyncio.run(main.resolve_symbol("apple inc")) == "AAPL"
+    assert len(calls) == 1
+
+
+def test_unknown_name_is_422_and_cached_as_miss(monkeypatch):
+    calls = []
+    monkeypatch.setattr(fmp, "search_symbol", fake([], calls=calls))
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(main.resolve_symbol("no such company"))
+        assert exc.value.status_code == 422
+    assert len(calls) == 1
+    assert main.resolve_cache._store["no such company"][0] == main.RESOLVE_MISS_TTL
+
+
+def test_failed_search_falls_back_uncached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(fmp, "search_symbol", fake(error=httpx.ConnectError("down"), calls=calls))
+    assert asyncio.run(main.resolve_symbol("some company")) == "SOME COMPANY"
+    assert main.resolve_cache.get("some company") is None
+
+
+# --- /analyze ---
+
+def test_analyze_caches_complete_result(client, fmp_data, llm):
+    first = client.post("/analyze", json={"symbol": "AAPL"}).json()
+    second = client.post("/analyze", json={"symbol": "AAPL"}).json()
+    assert first["analysis_md"] == "Hallo Welt" and first["cached"] is False
+    assert second["cached"] is True
+    assert llm.calls == 1
+    assert main.analyze_cache._store[f"AAPL:{main.settings.openai_model}"][0] == main.analyze_cache.ttl
+
+
+def test_degraded_analysis_gets_short_ttl(client, fmp_data, llm, monkeypatch):
+    monkeypatch.setattr(fmp, "get_key_metrics", fake(error=httpx.ConnectError("down")))
+    r = client.post("/analyze", json={"symbol": "AAPL"})
+    assert r.status_code == 200 and "degraded" not in r.json()
+    ttl, _, _ = main.analyze_cache._store[f"AAPL:{main.settings.openai_model}"]
+    assert ttl == main.DEGRADED_ANALYZE_TTL
+
+
+def test_failed_optional_section_keeps_full_ttl(client, fmp_data, llm, monkeypatch):
+    # z. B. ein Endpunkt, den der FMP-Plan nicht abdeckt: dauerhaft 403
+    forbidden = httpx.HTTPStatusError("403", request=httpx.Request("GET", "https://fmp"),
+                                      response=httpx.Response(403))
+    monkeypatch.setitem(main._FMP_FUNCS, "get_insider_trades", fake(error=forbidden))
+    monkeypatch.setattr(fmp, "get_peers", fake(error=httpx.ConnectError("down")))
+    assert client.post("/analyze", json={"symbol": "AAPL"}).status_code == 200
+    ttl, _, _ = main.analyze_cache._store[f"AAPL:{main.settings.openai_model}"]
+    assert ttl == main.analyze_cache.ttl
+
+
+def test_analyze_empty_fmp_data_is_422_without_llm(client, fmp_data, llm, monkeypatch):
+    for name in ("get_price_quote", "get_company_profile", "get_income_statement", "get_balance_sheet"):
+        monkeypatch.setattr(fmp, name, fake([]))
+    r = client.post("/analyze", json={"symbol": "AAPL"})
+    assert r.status_code == 422
+    assert llm.calls == 0
+
+
+def test_analyze_fmp_outage_is_502_without_llm(client, fmp_data, llm, monkeypatch):
+    for name in ("get_price_quote", "get_company_profile", "get_income_statement", "get_balance_sheet"):
+        monkeypatch.setattr(fmp, name, fake(error=httpx.ConnectError("down")))
+    r = client.post("/analyze", json={"symbol": "AAPL"})
+    assert r.status_code == 502
+    assert llm.calls == 0
+
+
+# --- SSE ---
+
+def parse_sse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line.removeprefix("event: ")
+            elif line.startswith("data: "):
+                data = orjson.loads(line.removeprefix("data: "))
+        events.append((event, data))
+    return events
+
+
+def test_stream_sends_deltas_then_done_uncompressed(client, fmp_data, llm):
+    with client.stream("POST", "/analyze/stream", json={"symbol": "AAPL"},
+                       headers={"Accept-Encoding": "gzip"}) as r:
+        assert r.headers["content-type"].startswith("text/event-stream")
+        assert "content-encoding" not in r.headers
+        body = b"".join(r.iter_raw()).decode()
+    events = parse_sse(body)
+    assert events[:2] == [("message", {"delta": "Hallo"}), ("message", {"delta": " Welt"})]
+    name, done = events[-1]
+    assert name == "done" and done["done"] is True and done["symbol"] == "AAPL"
+    assert done["model"] == main.settings.openai_model and done["as_of_utc"]
+
+
+def test_stream_reports_llm_error_as_event(client, fmp_data, monkeypatch):
+    class Broken:
+        chat = SimpleNamespace(completions=SimpleNamespace(create=fake(error=RuntimeError("boom"))))
+    monkeypatch.setattr(main, "get_client", lambda: Broken())
+    r = client.post("/analyze?stream=true", json={"symbol": "AAPL"})
+    events = parse_sse(r.text)
+    assert [name for name, _ in events] == ["error"]
+    assert "boom" in events[0][1]["detail"]
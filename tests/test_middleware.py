@@ -0,0 +1,81 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware import BearerAuthMiddleware, GZipMiddleware
+
+BIG = "x" * 4096
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/big")
+    async def big():
+        return PlainTextResponse(BIG)
+
+    @app.get("/sse")
+    async def sse():
+        async def events():
+            for i in range(3):
+                yield f"data: {BIG}{i}\n\n".encode()
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    @app.get("/secret")
+    async def secret():
+        return {"ok": True}
+
+    return app
+
+
+# --- GZip ---
+
+def test_gzip_compresses_regular_responses():
+    app = make_app()
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+    r = TestClient(app).get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.text == BIG
+
+
+def test_gzip_leaves_sse_uncompressed():
+    app = make_app()
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+    with TestClient(app).stream("GET", "/sse", headers={"Accept-Encoding": "gzip"}) as r:
+        assert "content-encoding" not in r.headers
+        assert r.headers["content-type"].startswith("text/event-stream")
+        body = b"".join(r.iter_raw())
+    # Rohbytes = Klartext-Events, also nicht durch den GZip-Puffer gelaufen
+    assert body == b"".join(f"data: {BIG}{i}\n\n".encode() for i in range(3))
+
+
+# --- Bearer-Auth ---
+
+def auth_client() -> TestClient:
+    app = make_app()
+    app.add_middleware(BearerAuthMiddleware, token="s3cret", public_paths=("/health",))
+    return TestClient(app)
+
+
+def test_auth_rejects_missing_and_wrong_token():
+    client = auth_client()
+    for headers in ({}, {"Authorization": "Bearer nope"}, {"Authorization": "s3cret"}):
+        r = client.get("/secret", headers=headers)
+        assert r.status_code == 401
+        assert r.json() == {"detail": "Unauthorized"}
+        assert r.headers["www-authenticate"] == "Bearer"
+
+
+def test_auth_accepts_correct_token():
+    r = auth_client().get("/secret", headers={"Authorization": "Bearer s3cret"})
+    assert r.status_code == 200
+
+
+def test_auth_skips_public_paths_and_preflight():
+    client = auth_client()
+    assert client.get("/health").status_code == 200
+    assert client.options("/secret").status_code != 401